@@ -1,3 +1,11 @@
+import os
+
 import eventlet
 
-eventlet.monkey_patch()
+# Patch what Swift's own servers patch, which is what the in-process servers
+# used by some tests need; set `SCALITY_TEST_GREEN` to run the whole suite
+# fully monkey-patched instead.
+if os.environ.get('SCALITY_TEST_GREEN'):
+    eventlet.monkey_patch()
+else:
+    eventlet.monkey_patch(socket=True, select=True, thread=True)
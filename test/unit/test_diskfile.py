@@ -15,10 +15,10 @@
 
 """Tests for swift_scality_backend.diskfile"""
 
+import collections
+import contextlib
 import hashlib
-import httplib
 import logging
-import StringIO
 import time
 import unittest
 
@@ -32,151 +32,159 @@ from scality_sproxyd_client.exceptions import SproxydHTTPException
 from swift_scality_backend.http_utils import ClientCollection
 from scality_sproxyd_client.sproxyd_client import SproxydClient
 from . import utils
-from .utils import make_client_collection
-
-
-NEW_SPLICE = 'new_splice'
-OLD_SPLICE = 'old_splice'
-NO_SPLICE_AT_ALL = 'no_splice_at_all'
-try:
-    import swift.common.splice
-    SPLICE = NEW_SPLICE
-except ImportError:
-    if hasattr(swift.common.utils, 'system_has_splice'):
-        SPLICE = OLD_SPLICE
+from .utils import DUMMY_LOGGER, make_client_collection
+from .utils import SPLICE, NEW_SPLICE, OLD_SPLICE, NO_SPLICE_AT_ALL
+
+
+# `splice` setting, system support, expected `use_splice`, warning expected
+_SPLICE_CASES = [
+    ('no', False, False, False),
+    ('yes', False, False, True),
+    ('yes', True, True, False),
+    ('no', True, False, False),
+]
+
+if SPLICE == NO_SPLICE_AT_ALL:
+    # Without any `splice` support in Swift, there's nothing to patch to make
+    # it available
+    _SPLICE_CASES = [case for case in _SPLICE_CASES if not case[1]]
+
+
+@contextlib.contextmanager
+def _patch_splice_availability():
+    '''Patch the Swift check for system `splice` support
+
+    This yields a function to set whether `splice` is reported as available.
+    '''
+
+    if SPLICE == NEW_SPLICE:
+        with mock.patch('swift.common.splice.splice') as mock_splice:
+            yield lambda available: setattr(
+                mock_splice, 'available', available)
+    elif SPLICE == OLD_SPLICE:
+        with mock.patch.object(swift.common.utils,
+                               'system_has_splice') as mock_has_splice:
+            yield lambda available: setattr(
+                mock_has_splice, 'return_value', available)
     else:
-        SPLICE = NO_SPLICE_AT_ALL
+        def set_available(available):
+            assert not available, 'This Swift doesn\'t know `splice`'
 
+        yield set_available
 
-class FakeHTTPResp(httplib.HTTPResponse):
 
-    def __init__(self, status=200):
-        self.status = status
-        self.reason = 'because'
+(setUpModule, tearDownModule) = utils.without_health_checks()
+
+
+class FakeHTTPResp(collections.namedtuple('FakeHTTPResp', 'status reason')):
+    __slots__ = ()
 
     def read(self):
         return 'My mock msg'
 
 
-class FakeHTTPConn(mock.Mock):
+class FakeHTTPConn(object):
 
-    def __init__(self, *args, **kwargs):
-        super(FakeHTTPConn, self).__init__(*args, **kwargs)
-        self.resp_status = kwargs.get('resp_status', 200)
-        self._buffer = StringIO.StringIO()
+    def __init__(self, resp_status=200):
+        self.resp_status = resp_status
+        self._buffer = bytearray()
+        self.close = mock.Mock()
 
     def getresponse(self):
-        return FakeHTTPResp(self.resp_status)
+        return FakeHTTPResp(self.resp_status, 'because')
 
     def send(self, data):
-        self._buffer.write(data)
+        self._buffer.extend(data)
 
 
 class TestDiskFileManager(unittest.TestCase):
     """Tests for swift_scality_backend.diskfile.DiskFileManager"""
 
+    @classmethod
+    def setUpClass(cls):
+        cls.client_collection = make_client_collection()
+
     def test_init_with_default_splice(self):
-        dfm = DiskFileManager({}, mock.Mock())
+        dfm = DiskFileManager({}, DUMMY_LOGGER)
         self.assertFalse(dfm.use_splice)
 
     def test_init_with_splice_no(self):
-        dfm = DiskFileManager({'splice': 'no'}, mock.Mock())
+        dfm = DiskFileManager({'splice': 'no'}, DUMMY_LOGGER)
         self.assertFalse(dfm.use_splice)
 
-    def _test_init_splice_unavailable(self):
-        dfm = DiskFileManager({'splice': 'no'}, mock.Mock())
-        self.assertFalse(dfm.use_splice, "Splice not wanted by conf and not " +
-                         "available from system: use_splice should be False")
-
-        mock_logger = mock.Mock()
-        dfm = DiskFileManager({'splice': 'yes'}, mock_logger)
-        self.assertFalse(dfm.use_splice, "Splice wanted by conf but not " +
-                         "available from system: use_splice should be False")
-        self.assertTrue(mock_logger.warn.called)
-
-    def _test_init_splice_available(self):
-        dfm = DiskFileManager({'splice': 'yes'}, mock.Mock())
-        self.assertTrue(dfm.use_splice, "Splice wanted by conf and " +
-                        "available from system: use_splice should be True")
-
-        dfm = DiskFileManager({'splice': 'no'}, mock.Mock())
-        self.assertFalse(dfm.use_splice, "Splice not wanted by conf though " +
-                         "available from system: use_splice should be False")
-
-    @utils.skipIf(SPLICE != NEW_SPLICE, 'Need new `splice` support')
-    @mock.patch('swift.common.splice.splice')
-    def test_init_new_splice_unavailable(self, mock_splice):
-        type(mock_splice).available = mock.PropertyMock(return_value=False)
-        self._test_init_splice_unavailable()
-
-    @utils.skipIf(SPLICE != NEW_SPLICE, 'Need new `splice` support')
-    @mock.patch('swift.common.splice.splice')
-    def test_init_new_splice_is_available(self, mock_splice):
-        type(mock_splice).available = mock.PropertyMock(return_value=True)
-        self._test_init_splice_available()
-
-    @utils.skipIf(SPLICE != OLD_SPLICE, 'Need old `splice` support')
-    @mock.patch.object(swift.common.utils, 'system_has_splice',
-                       return_value=True)
-    def test_init_old_splice_is_available(self, mock_splice):
-        self._test_init_splice_available()
-
-    @utils.skipIf(SPLICE != OLD_SPLICE, 'Need old `splice` support')
-    @mock.patch.object(swift.common.utils, 'system_has_splice',
-                       return_value=False)
-    def test_init_old_splice_unavailable(self, mock_splice):
-        self._test_init_splice_unavailable()
-
-    @utils.skipIf(SPLICE != NO_SPLICE_AT_ALL, 'This Swift knows `splice`')
-    def test_init_no_splice_at_all(self):
-        self._test_init_splice_unavailable()
-
     def test_get_diskfile(self):
-        client_collection = make_client_collection()
-        dfm = DiskFileManager({}, mock.Mock())
+        dfm = DiskFileManager({}, DUMMY_LOGGER)
 
-        diskfile = dfm.get_diskfile(client_collection, 'a', 'c', 'o')
+        diskfile = dfm.get_diskfile(self.client_collection, 'a', 'c', 'o')
         self.assertTrue(isinstance(diskfile, DiskFile))
 
 
+
+def _make_init_splice_test(conf_splice, available, use_splice, warns):
+    def test(self):
+        with _patch_splice_availability() as set_splice_available:
+            set_splice_available(available)
+
+            mock_logger = mock.Mock()
+            dfm = DiskFileManager({'splice': conf_splice}, mock_logger)
+
+            self.assertEqual(use_splice, dfm.use_splice)
+            self.assertEqual(warns, mock_logger.warn.called)
+
+    return test
+
+
+for _case in _SPLICE_CASES:
+    _test = _make_init_splice_test(*_case)
+    _test.__name__ = 'test_init_splice_%s_%s' % (
+        _case[0], 'available' if _case[1] else 'unavailable')
+    setattr(TestDiskFileManager, _test.__name__, _test)
+
+del _case, _test
+
+
 class TestDiskFileWriter(unittest.TestCase):
     """Tests for swift_scality_backend.diskfile.DiskFileWriter"""
 
-    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.get_http_conn_for_put',
-                return_value=(None, None))
-    def test_init(self, mock_http):
-        client_collection = make_client_collection()
+    @classmethod
+    def setUpClass(cls):
+        cls.client_collection = make_client_collection()
+
+    def setUp(self):
+        patcher = mock.patch.object(
+            SproxydClient, 'get_http_conn_for_put',
+            return_value=(FakeHTTPConn(), mock.Mock()))
+        self.mock_http = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_init(self):
         # Note the white space, to test proper URL encoding
-        DiskFileWriter(client_collection, 'ob j', logger=logging.root)
+        DiskFileWriter(self.client_collection, 'ob j', logger=logging.root)
 
         expected_header = {'transfer-encoding': 'chunked'}
-        mock_http.assert_called_once_with('ob j', expected_header)
+        self.mock_http.assert_called_once_with('ob j', expected_header)
+
+    def test_put_with_404_response(self):
+        self.mock_http.return_value = (FakeHTTPConn(resp_status=404), None)
 
-    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.get_http_conn_for_put',
-                return_value=(FakeHTTPConn(resp_status=404), None))
-    def test_put_with_404_response(self, mock_http):
-        client_collection = make_client_collection()
-        dfw = DiskFileWriter(client_collection, 'obj', logger=logging.root)
+        dfw = DiskFileWriter(self.client_collection, 'obj', logger=logging.root)
 
-        fake_http_conn = mock_http.return_value[0]
+        fake_http_conn = self.mock_http.return_value[0]
         msg = r'.*404 / %s.*' % fake_http_conn.getresponse().read()
         utils.assertRaisesRegexp(SproxydHTTPException, msg, dfw.put, {})
 
         fake_http_conn.close.assert_called_once_with()
 
-    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.get_http_conn_for_put',
-                return_value=(FakeHTTPConn(), mock.Mock()))
-    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.put_meta')
-    def test_put_with_200_response(self, mock_put_meta, mock_http):
-        client_collection = make_client_collection()
-        dfw = DiskFileWriter(client_collection, 'obj', logger=logging.root)
+    @mock.patch.object(SproxydClient, 'put_meta')
+    def test_put_with_200_response(self, mock_put_meta):
+        dfw = DiskFileWriter(self.client_collection, 'obj', logger=logging.root)
 
         dfw.put({'meta1': 'val'})
 
-        fake_http_conn = mock_http.return_value[0]
-        self.assertEqual('0\r\n\r\n', fake_http_conn._buffer.getvalue())
+        fake_http_conn = self.mock_http.return_value[0]
+        self.assertEqual('0\r\n\r\n', bytes(fake_http_conn._buffer))
 
-        mock_release_conn = mock_http.return_value[1]
+        mock_release_conn = self.mock_http.return_value[1]
         mock_release_conn.assert_called_once_with()
 
         mock_put_meta.assert_called_with('obj', {
@@ -187,37 +195,37 @@ class TestDiskFileWriter(unittest.TestCase):
             'name': 'obj'
         })
 
-    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.get_http_conn_for_put',
-                return_value=(FakeHTTPConn(), mock.Mock()))
-    def test_write_no_data(self, mock_http):
-        dfw = DiskFileWriter(make_client_collection(), 'obj',
+    def test_write_no_data(self):
+        dfw = DiskFileWriter(self.client_collection, 'obj',
                              logger=logging.root)
 
         written = dfw.write("")
 
         self.assertEqual(0, written)
-        fake_http_conn = mock_http.return_value[0]
-        self.assertEqual('0\r\n\r\n', fake_http_conn._buffer.getvalue())
+        fake_http_conn = self.mock_http.return_value[0]
+        self.assertEqual('0\r\n\r\n', bytes(fake_http_conn._buffer))
 
-    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.get_http_conn_for_put',
-                return_value=(FakeHTTPConn(), mock.Mock()))
-    def test_write_with_data(self, mock_http):
-        dfw = DiskFileWriter(make_client_collection(), 'obj',
+    def test_write_with_data(self):
+        dfw = DiskFileWriter(self.client_collection, 'obj',
                              logger=logging.root)
 
         data = "a" * 4096
         written = dfw.write(data)
 
         self.assertEqual(len(data), written)
-        fake_http_conn = mock_http.return_value[0]
+        fake_http_conn = self.mock_http.return_value[0]
         self.assertEqual('%x\r\n%s\r\n' % (len(data), data),
-                         fake_http_conn._buffer.getvalue())
+                         bytes(fake_http_conn._buffer))
 
 
 class TestDiskFileReader(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        cls.client_collection = make_client_collection()
+
     def test_app_iter_ranges_with_no_ranges(self):
-        dfr = DiskFileReader(make_client_collection(), 'obj', False,
+        dfr = DiskFileReader(self.client_collection, 'obj', False,
                              logger=logging.root)
 
         gen = dfr.app_iter_ranges([], mock.sentinel.arg1,
@@ -228,7 +236,7 @@ class TestDiskFileReader(unittest.TestCase):
     @mock.patch('swift.common.swob.multi_range_iterator')
     def test_app_iter_ranges(self, mock_mri):
         mock_mri.return_value = iter(['data'])
-        dfr = DiskFileReader(make_client_collection(), 'obj', False,
+        dfr = DiskFileReader(self.client_collection, 'obj', False,
                              logger=logging.root)
 
         gen = dfr.app_iter_ranges([(1, 100)], mock.sentinel.arg1,
@@ -253,61 +261,56 @@ class TestDiskFile(unittest.TestCase):
             sha1.update(string)
         return sha1.hexdigest()
 
+    @classmethod
+    def setUpClass(cls):
+        cls.client_collection = make_client_collection()
+
     def test_init_quotes_object_path(self):
         acc, cont, obj = 'a', '@/', '/ob/j'
 
-        sproxyd_client = SproxydClient(['http://host:81/path/'], logger=mock.Mock())
-        df = DiskFile(sproxyd_client, acc, cont, obj,
+        df = DiskFile(self.client_collection, acc, cont, obj,
                       use_splice=False, logger=logging.root)
         self.assertEqual(self.hash_str([acc, cont, obj]), df._name)
 
-    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.get_meta',
-                return_value=None)
+    @mock.patch.object(SproxydClient, 'get_meta', return_value=None)
     def test_open_when_no_metadata(self, mock_get_meta):
         acc, cont, obj = 'a', 'c', 'o'
 
-        client_collection = make_client_collection()
-        df = DiskFile(client_collection, acc, cont, obj, use_splice=False,
+        df = DiskFile(self.client_collection, acc, cont, obj, use_splice=False,
                       logger=logging.root)
 
         self.assertRaises(swift.common.exceptions.DiskFileDeleted, df.open)
         mock_get_meta.assert_called_once_with(self.hash_str([acc, cont, obj]))
 
-    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.get_meta',
-                return_value={'name': 'o'})
+    @mock.patch.object(SproxydClient, 'get_meta', return_value={'name': 'o'})
     def test_open(self, mock_get_meta):
-        client_collection = make_client_collection()
-        df = DiskFile(client_collection, 'a', 'c', 'o', use_splice=False,
+        df = DiskFile(self.client_collection, 'a', 'c', 'o', use_splice=False,
                       logger=logging.root)
 
         df.open()
 
         self.assertEqual({'name': 'o', 'mf': {}, 'df': {'name': 'o'}}, df._metadata)
 
-    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.get_meta')
+    @mock.patch.object(SproxydClient, 'get_meta')
     def test_open_expired_file(self, mock_get_meta):
         acc, cont, obj = 'a', 'c', 'o'
         mock_get_meta.return_value = {'X-Delete-At': time.time() - 10}
 
-        client_collection = make_client_collection()
-        df = DiskFile(client_collection, acc, cont, obj, use_splice=False,
+        df = DiskFile(self.client_collection, acc, cont, obj, use_splice=False,
                       logger=logging.root)
         self.assertRaises(swift.common.exceptions.DiskFileExpired, df.open)
         mock_get_meta.assert_called_once_with(self.hash_str([acc, cont, obj]))
 
     def test_get_metadata_when_diskfile_not_open(self):
-        client_collection = make_client_collection()
-        df = DiskFile(client_collection, 'a', 'c', 'o', use_splice=False,
+        df = DiskFile(self.client_collection, 'a', 'c', 'o', use_splice=False,
                       logger=logging.root)
 
         self.assertRaises(swift.common.exceptions.DiskFileNotOpen,
                           df.get_metadata)
 
-    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.get_meta',
-                return_value={'name': 'o'})
+    @mock.patch.object(SproxydClient, 'get_meta', return_value={'name': 'o'})
     def test_read_metadata(self, mock_get_meta):
-        client_collection = make_client_collection()
-        df = DiskFile(client_collection, 'a', 'c', 'o', use_splice=False,
+        df = DiskFile(self.client_collection, 'a', 'c', 'o', use_splice=False,
                       logger=logging.root)
 
         metadata = df.read_metadata()
@@ -315,29 +318,26 @@ class TestDiskFile(unittest.TestCase):
         self.assertEqual({'name': 'o'}, metadata)
 
     def test_reader(self):
-        client_collection = make_client_collection()
-        df = DiskFile(client_collection, 'a', 'c', 'o', use_splice=False,
+        df = DiskFile(self.client_collection, 'a', 'c', 'o', use_splice=False,
                       logger=logging.root)
 
         reader = df.reader()
         self.assertTrue(isinstance(reader, DiskFileReader))
 
-    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.get_http_conn_for_put',
-                return_value=(FakeHTTPConn(), mock.Mock()))
+    @mock.patch.object(SproxydClient, 'get_http_conn_for_put')
     def test_create(self, mock_http):
-        client_collection = make_client_collection()
-        df = DiskFile(client_collection, 'a', 'c', 'o', use_splice=False,
+        mock_http.return_value = (FakeHTTPConn(), mock.Mock())
+        df = DiskFile(self.client_collection, 'a', 'c', 'o', use_splice=False,
                       logger=logging.root)
 
         with df.create() as writer:
             self.assertTrue(isinstance(writer, DiskFileWriter))
 
-    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.put_meta')
+    @mock.patch.object(SproxydClient, 'put_meta')
     def test_write_metadata(self, mock_put_meta):
         acc, cont, obj = 'a', 'c', 'o'
 
-        client_collection = make_client_collection()
-        df = DiskFile(client_collection, acc, cont, obj, use_splice=False,
+        df = DiskFile(self.client_collection, acc, cont, obj, use_splice=False,
                       logger=logging.root)
 
         df.write_metadata({'k': 'v'})
@@ -348,12 +348,11 @@ class TestDiskFile(unittest.TestCase):
             'mf': {'k': 'v'}
         })
 
-    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.del_object')
+    @mock.patch.object(SproxydClient, 'del_object')
     def test_delete(self, mock_del_object):
         acc, cont, obj = 'a', 'c', 'o'
 
-        client_collection = make_client_collection()
-        df = DiskFile(client_collection, acc, cont, obj, use_splice=False,
+        df = DiskFile(self.client_collection, acc, cont, obj, use_splice=False,
                       logger=logging.root)
 
         df.delete("ignored")
@@ -362,8 +361,7 @@ class TestDiskFile(unittest.TestCase):
 
     @utils.skipIf(not hasattr(swift.common.utils, 'Timestamp'), 'Swift2+ only')
     def test_timestamps_when_no_metadata(self):
-        client_collection = make_client_collection()
-        df = DiskFile(client_collection, 'a', 'c', 'o', use_splice=False,
+        df = DiskFile(self.client_collection, 'a', 'c', 'o', use_splice=False,
                       logger=logging.root)
 
         # assertRaises expects a `callable`, but `timestamp` is a property
@@ -377,8 +375,7 @@ class TestDiskFile(unittest.TestCase):
     @utils.skipIf(not hasattr(swift.common.utils, 'Timestamp'), 'Swift2+ only')
     @mock.patch('swift.common.utils.Timestamp')
     def test_timestamp(self, mock_timestamp):
-        client_collection = make_client_collection()
-        df = DiskFile(client_collection, 'a', 'c', 'o', use_splice=False,
+        df = DiskFile(self.client_collection, 'a', 'c', 'o', use_splice=False,
                       logger=logging.root)
 
         df._metadata = mock.Mock()
@@ -16,12 +16,10 @@
 '''Tests for `swift_scality_backend.http_utils`'''
 
 import contextlib
-import os
 import socket
 import sys
 import unittest
 
-import eventlet
 import mock
 
 import swift_scality_backend.http_utils
@@ -29,12 +27,22 @@ from . import utils
 
 
 class TestSomewhatBufferedFileObject(unittest.TestCase):
+    DATA = 'abcdefgh\n' * 10
+    # What's left on the socket after one `readline` and a 3-byte `read`
+    EXPECTED_TAIL = DATA[len('abcdefgh\n') + 3:]
+
     @contextlib.contextmanager
-    def _make_socket(self, addr=None, buffsize=8):
-        if not addr:
+    def _make_socket(self, data=None, buffsize=8):
+        if data is None:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
         else:
-            sock = eventlet.connect(addr)
+            # The peer sends everything upfront and hangs up, so no server
+            # thread is needed
+            sock, peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                peer.sendall(data)
+            finally:
+                peer.close()
 
         try:
             yield swift_scality_backend.http_utils.SomewhatBufferedFileObject(
@@ -94,38 +102,25 @@ class TestSomewhatBufferedFileObject(unittest.TestCase):
                 sock.next)
 
     def test_interaction(self):
-        server_socket = eventlet.listen(('127.0.0.1', 0))
-
-        data = 'abcdefgh\n' * 10
-
-        def server(client, _):
-            client.sendall(data)
-            client.close()
-
-        server_thread = eventlet.spawn(
-            eventlet.serve, server_socket, server)
-
-        try:
-            with self._make_socket(
-                    server_socket.getsockname()) as sock:
-                fst = sock.readline()
-                self.assertEqual(fst, 'abcdefgh\n')
-                snd = sock.read(size=3)
-                self.assertEqual(snd, 'abc')
-                buf = sock.get_buffered()
-                self.assertEqual(buf, 'defg')
-
-                rest = [buf]
-                while True:
-                    s = os.read(sock.fileno(), 32)
-                    if len(s) == 0:
-                        break
-                    rest.append(s)
-
-                off = len(fst) + len(snd)
-                self.assertEqual(''.join(rest), data[off:])
-        finally:
-            server_thread.kill()
+        with self._make_socket(self.DATA) as sock:
+            fst = sock.readline()
+            self.assertEqual(fst, 'abcdefgh\n')
+            snd = sock.read(size=3)
+            self.assertEqual(snd, 'abc')
+            buf = sock.get_buffered()
+            self.assertEqual(buf, 'defg')
+
+            remaining = len(self.EXPECTED_TAIL) - len(buf)
+            rest = bytearray(remaining)
+            view = memoryview(rest)
+            received = 0
+            while received < remaining:
+                count = sock._sock.recv_into(view[received:])
+                if count == 0:
+                    break
+                received += count
+
+            self.assertEqual(buf + bytes(rest[:received]), self.EXPECTED_TAIL)
 
 
 class TestSomewhatBufferedHTTPConnection(unittest.TestCase):
@@ -15,13 +15,10 @@
 
 '''Tests for `swift_scality_backend.policy_configuration`.'''
 
+import io
+import re
+import textwrap
 import unittest
-try:
-    from cStringIO import StringIO
-except ImportError:
-    from StringIO import StringIO
-
-import utils
 
 from swift_scality_backend.policy_configuration import Configuration
 from swift_scality_backend.policy_configuration import ConfigurationError
@@ -31,6 +28,51 @@ from swift_scality_backend.policy_configuration import Ring
 from swift_scality_backend.policy_configuration import StoragePolicy
 
 
+_TEST_CONFIGURATION = '''
+[ring:paris-rep3]
+location = paris
+sproxyd_endpoints = http://paris1.int/rep3, http://paris2.int/rep3
+
+[ring:paris-arc6+3]
+location = paris
+sproxyd_endpoints = http://paris1.int/arc6+3, http://paris2.int/arc6+3
+
+[ring:sfo-arc6+3]
+location = sfo
+sproxyd_endpoints = http://sfo1.int/arc6+3
+
+[ring:nyc-arc6+3]
+location = nyc
+sproxyd_endpoints = http://nyc1.int/arc6+3
+
+[storage-policy:1]
+read = sfo-arc6+3
+write = paris-arc6+3
+
+[storage-policy:2]
+read = nyc-arc6+3
+write = paris-arc6+3
+
+[storage-policy:3]
+read =
+write = paris-rep3
+'''
+
+
+def _config_stream(text):
+    '''Wrap configuration text in a stream for `Configuration.from_stream`'''
+
+    return io.BytesIO(text)
+
+
+def setUpModule():
+    # The `test_hash_not_equal` tests rely on these strings not colliding: if
+    # they did, those tests would fail as well, which is not the intention
+    assert hash('http://localhost/path') != hash('http://otherhost/path')
+    assert hash('paris') != hash('london')
+    assert hash('paris-arc6+3') != hash('paris-chord3')
+
+
 class TestEndpoint(unittest.TestCase):
     def test_hash_equal(self):
         url = 'http://localhost:81/path'
@@ -40,11 +82,6 @@ class TestEndpoint(unittest.TestCase):
             hash(Endpoint(url)))
 
     def test_hash_not_equal(self):
-        # If this fails, the subsequent test would fail as well, unexpectedly
-        self.assertNotEqual(
-            hash('http://localhost/path'),
-            hash('http://otherhost/path'))
-
         self.assertNotEqual(
             hash(Endpoint('http://localhost/path')),
             hash(Endpoint('http://otherhost/path')))
@@ -57,22 +94,19 @@ class TestEndpoint(unittest.TestCase):
         self.assertNotEqual(Endpoint('http://localhost'), 1)
 
     def test_reject_params(self):
-        utils.assertRaisesRegexp(
-            ValueError,
-            r'Endpoint URL can\'t have params',
-            Endpoint, 'http://localhost/;param')
+        with self.assertRaisesRegexp(
+                ValueError, r'Endpoint URL can\'t have params'):
+            Endpoint('http://localhost/;param')
 
     def test_reject_query(self):
-        utils.assertRaisesRegexp(
-            ValueError,
-            r'Endpoint URL can\'t have query values',
-            Endpoint, 'http://localhost/?query')
+        with self.assertRaisesRegexp(
+                ValueError, r'Endpoint URL can\'t have query values'):
+            Endpoint('http://localhost/?query')
 
     def test_reject_fragment(self):
-        utils.assertRaisesRegexp(
-            ValueError,
-            r'Endpoint URL can\'t have a fragment',
-            Endpoint, 'http://localhost/#fragment')
+        with self.assertRaisesRegexp(
+                ValueError, r'Endpoint URL can\'t have a fragment'):
+            Endpoint('http://localhost/#fragment')
 
 
 class TestLocation(unittest.TestCase):
@@ -92,9 +126,6 @@ class TestLocation(unittest.TestCase):
         self.assertEqual(hash(Location('paris')), hash(Location('paris')))
 
     def test_hash_not_equal(self):
-        # Require this first... If this fails, our test would fail as well which
-        # is not the intention
-        self.assertNotEqual(hash('paris'), hash('london'))
         self.assertNotEqual(hash(Location('paris')), hash(Location('london')))
 
 
@@ -133,8 +164,6 @@ class TestRing(unittest.TestCase):
         self.assertEqual(hash(r1), hash(r2))
 
     def test_hash_not_equal(self):
-        self.assertNotEqual(hash('paris-arc6+3'), hash('paris-chord3'))
-
         self.assertNotEqual(
             hash(Ring('paris-arc6+3', 'paris', [])),
             hash(Ring('paris-chord3', 'paris', [])))
@@ -285,35 +314,28 @@ class TestStoragePolicy(unittest.TestCase):
 
 
 class TestConfiguration(unittest.TestCase):
-    TEST_CONFIGURATION = '\n'.join(line.lstrip() for line in '''
-        [ring:paris-rep3]
-        location = paris
-        sproxyd_endpoints = http://paris1.int/rep3, http://paris2.int/rep3
+    TEST_CONFIGURATION = _TEST_CONFIGURATION
 
-        [ring:paris-arc6+3]
-        location = paris
-        sproxyd_endpoints = http://paris1.int/arc6+3, http://paris2.int/arc6+3
-
-        [ring:sfo-arc6+3]
-        location = sfo
-        sproxyd_endpoints = http://sfo1.int/arc6+3
-
-        [ring:nyc-arc6+3]
-        location = nyc
-        sproxyd_endpoints = http://nyc1.int/arc6+3
+    # Rings defined in `TEST_CONFIGURATION`
+    _PARIS_REP3 = Ring(
+        'paris-rep3', 'paris',
+        ['http://paris1.int/rep3', 'http://paris2.int/rep3'])
+    _PARIS_ARC = Ring(
+        'paris-arc6+3', 'paris',
+        ['http://paris1.int/arc6+3', 'http://paris2.int/arc6+3'])
+    _SFO_ARC = Ring('sfo-arc6+3', 'sfo', ['http://sfo1.int/arc6+3'])
+    _NYC_ARC = Ring('nyc-arc6+3', 'nyc', ['http://nyc1.int/arc6+3'])
 
-        [storage-policy:1]
-        read = sfo-arc6+3
-        write = paris-arc6+3
+    # `TEST_CONFIGURATION`, parsed by the first test using it
+    _parsed = None
 
-        [storage-policy:2]
-        read = nyc-arc6+3
-        write = paris-arc6+3
+    @classmethod
+    def _get_parsed(cls):
+        if cls._parsed is None:
+            cls._parsed = Configuration.from_stream(
+                _config_stream(cls.TEST_CONFIGURATION))
 
-        [storage-policy:3]
-        read =
-        write = paris-rep3
-        '''.splitlines())
+        return cls._parsed
 
     def test_duplicate_index(self):
         p1 = StoragePolicy(1, [], [])
@@ -347,218 +369,159 @@ class TestConfiguration(unittest.TestCase):
             hash(Configuration([p])))
 
     def test_from_stream(self):
-        conf = Configuration.from_stream(StringIO(self.TEST_CONFIGURATION))
+        conf = self._get_parsed()
 
         p1 = conf.get_policy(1)
         self.assertEqual(p1.index, 1)
-        self.assertEqual(
-            list(p1.read_set),
-            [Ring('sfo-arc6+3', 'sfo', ['http://sfo1.int/arc6+3'])])
-        self.assertEqual(
-            list(p1.write_set),
-            [Ring(
-                'paris-arc6+3', 'paris',
-                ['http://paris1.int/arc6+3', 'http://paris2.int/arc6+3'])])
+        self.assertEqual(p1.read_set, frozenset([self._SFO_ARC]))
+        self.assertEqual(p1.write_set, frozenset([self._PARIS_ARC]))
 
         p2 = conf.get_policy(2)
         self.assertEqual(
-            p2,
-            StoragePolicy(
-                2,
-                [Ring('nyc-arc6+3', 'nyc', ['http://nyc1.int/arc6+3'])],
-                [Ring(
-                    'paris-arc6+3', 'paris',
-                    ['http://paris1.int/arc6+3', 'http://paris2.int/arc6+3'])]))
+            p2, StoragePolicy(2, [self._NYC_ARC], [self._PARIS_ARC]))
 
         p3 = conf.get_policy(3)
-        self.assertEqual(
-            p3,
-            StoragePolicy(
-                3,
-                [],
-                [Ring(
-                    'paris-rep3', 'paris',
-                    ['http://paris1.int/rep3', 'http://paris2.int/rep3'])]))
+        self.assertEqual(p3, StoragePolicy(3, [], [self._PARIS_REP3]))
 
         self.assertRaises(ValueError, conf.get_policy, 4)
         self.assertRaises(ValueError, conf.get_policy, 'test')
 
     def test_to_stream(self):
-        conf = Configuration.from_stream(StringIO(self.TEST_CONFIGURATION))
-
-        out = StringIO()
-        conf.to_stream(out)
-
-        conf2 = Configuration.from_stream(StringIO(out.getvalue()))
-
-        self.assertEqual(conf, conf2)
-
-    @staticmethod
-    def _format_config(conf):
-        return StringIO(
-            '\n'.join(
-                line.lstrip() for line in conf.splitlines()))
-
-    def test_missing_ring_name(self):
-        conf = self._format_config('''
-            [ring:]
-            location = test
-            sproxyd_endpoints = http://localhost
-            ''')
-
-        utils.assertRaisesRegexp(
-            ConfigurationError,
-            'Invalid section name \'ring:\'',
-            Configuration.from_stream, conf)
-
-    def test_missing_ring_location(self):
-        conf = self._format_config('''
-            [ring:test]
-            sproxyd_endpoints = http://localhost
-            ''')
-
-        utils.assertRaisesRegexp(
-            ConfigurationError,
-            '''Section 'ring:test' lacks a 'location' setting''',
-            Configuration.from_stream, conf)
-
-    def test_empty_ring_location(self):
-        conf = self._format_config('''
-            [ring:test]
-            location =
-            sproxyd_endpoints = http://localhost
-            ''')
-
-        utils.assertRaisesRegexp(
-            ConfigurationError,
-            'Invalid \'location\' setting in \'ring:test\'',
-            Configuration.from_stream, conf)
-
-    def test_empty_ring_sproxyd_endpoints(self):
-        conf = self._format_config('''
-            [ring:test]
-            location = test
-            sproxyd_endpoints =
-            ''')
-
-        utils.assertRaisesRegexp(
-            ConfigurationError,
-            'Invalid \'sproxyd_endpoints\' setting in \'ring:test\'',
-            Configuration.from_stream, conf)
-
-    def test_missing_ring_sproxyd_endpoints(self):
-        conf = self._format_config('''
-            [ring:test]
-            location = paris
-            ''')
+        parsed = self._get_parsed()
 
-        utils.assertRaisesRegexp(
-            ConfigurationError,
-            '''Section 'ring:test' lacks a 'sproxyd_endpoints' setting''',
-            Configuration.from_stream, conf)
+        out = io.BytesIO()
+        parsed.to_stream(out)
 
-    def test_invalid_ring_sproxyd_endpoint(self):
-        conf = self._format_config('''
-            [ring:test]
-            location = paris
-            sproxyd_endpoints = http://localhost, http://otherhost/?a=b
-            ''')
-
-        utils.assertRaisesRegexp(
-            ConfigurationError,
-            'Error parsing endpoint \'http://otherhost/\?a=b\' in '
-            '\'ring:test\': Endpoint URL can\'t have query values',
-            Configuration.from_stream, conf)
-
-    def test_non_int_storage_policy_index(self):
-        conf = self._format_config('''
-            [storage-policy:test]
-            read =
-            write = test
-            ''')
-
-        utils.assertRaisesRegexp(
-            ConfigurationError,
-            'Invalid policy index: \'test\'',
-            Configuration.from_stream, conf)
-
-    def test_empty_storage_policy_index(self):
-        conf = self._format_config('''
-            [storage-policy:]
-            read =
-            write = test
-            ''')
+        conf = Configuration.from_stream(_config_stream(out.getvalue()))
 
-        utils.assertRaisesRegexp(
-            ConfigurationError,
-            'Invalid section name \'storage-policy:\'',
-            Configuration.from_stream, conf)
+        self.assertEqual(parsed, conf)
 
-    def test_unknown_write_ring_in_storage_policy(self):
-        conf = self._format_config('''
+    def test_missing_read_in_storage_policy(self):
+        conf = textwrap.dedent('''
             [ring:test1]
             location = paris
             sproxyd_endpoints = http://localhost
 
             [storage-policy:1]
-            read =
-            write = test2
+            write = test1
             ''')
 
-        utils.assertRaisesRegexp(
-            ConfigurationError,
-            'Unknown \'write\' ring \'test2\' in policy 1',
-            Configuration.from_stream, conf)
+        conf = Configuration.from_stream(_config_stream(conf))
 
-    def test_unknown_read_ring_in_storage_policy(self):
-        conf = self._format_config('''
-            [ring:test1]
-            location = paris
-            sproxyd_endpoints = http://localhost
+        read_set = conf.get_policy(1).read_set
+        if len(read_set) != 0:
+            raise self.failureException(
+                '%r is not empty' % read_set)
 
-            [storage-policy:1]
-            read = test2
-            write = test1
-            ''')
 
-        utils.assertRaisesRegexp(
-            ConfigurationError,
-            'Unknown \'read\' ring \'test2\' in policy 1',
-            Configuration.from_stream, conf)
+# Name of each generated test, offending configuration and expected error
+_CONFIG_ERROR_CASES = [
+    ('missing_ring_name',
+     textwrap.dedent('''
+        [ring:]
+        location = test
+        sproxyd_endpoints = http://localhost
+        '''),
+     re.compile('Invalid section name \'ring:\'')),
+    ('missing_ring_location',
+     textwrap.dedent('''
+        [ring:test]
+        sproxyd_endpoints = http://localhost
+        '''),
+     re.compile('''Section 'ring:test' lacks a 'location' setting''')),
+    ('empty_ring_location',
+     textwrap.dedent('''
+        [ring:test]
+        location =
+        sproxyd_endpoints = http://localhost
+        '''),
+     re.compile('Invalid \'location\' setting in \'ring:test\'')),
+    ('empty_ring_sproxyd_endpoints',
+     textwrap.dedent('''
+        [ring:test]
+        location = test
+        sproxyd_endpoints =
+        '''),
+     re.compile('Invalid \'sproxyd_endpoints\' setting in \'ring:test\'')),
+    ('missing_ring_sproxyd_endpoints',
+     textwrap.dedent('''
+        [ring:test]
+        location = paris
+        '''),
+     re.compile('''Section 'ring:test' lacks a 'sproxyd_endpoints' setting''')),
+    ('invalid_ring_sproxyd_endpoint',
+     textwrap.dedent('''
+        [ring:test]
+        location = paris
+        sproxyd_endpoints = http://localhost, http://otherhost/?a=b
+        '''),
+     re.compile('Error parsing endpoint \'http://otherhost/\?a=b\' in '
+                '\'ring:test\': Endpoint URL can\'t have query values')),
+    ('non_int_storage_policy_index',
+     textwrap.dedent('''
+        [storage-policy:test]
+        read =
+        write = test
+        '''),
+     re.compile('Invalid policy index: \'test\'')),
+    ('empty_storage_policy_index',
+     textwrap.dedent('''
+        [storage-policy:]
+        read =
+        write = test
+        '''),
+     re.compile('Invalid section name \'storage-policy:\'')),
+    ('unknown_write_ring_in_storage_policy',
+     textwrap.dedent('''
+        [ring:test1]
+        location = paris
+        sproxyd_endpoints = http://localhost
+
+        [storage-policy:1]
+        read =
+        write = test2
+        '''),
+     re.compile('Unknown \'write\' ring \'test2\' in policy 1')),
+    ('unknown_read_ring_in_storage_policy',
+     textwrap.dedent('''
+        [ring:test1]
+        location = paris
+        sproxyd_endpoints = http://localhost
 
-    def test_multiple_write_rings_in_storage_policy(self):
-        conf = self._format_config('''
-            [ring:test1]
-            location = paris
-            sproxyd_endpoints = http://paris
+        [storage-policy:1]
+        read = test2
+        write = test1
+        '''),
+     re.compile('Unknown \'read\' ring \'test2\' in policy 1')),
+    ('multiple_write_rings_in_storage_policy',
+     textwrap.dedent('''
+        [ring:test1]
+        location = paris
+        sproxyd_endpoints = http://paris
 
-            [ring:test2]
-            location = london
-            sproxyd_endpoints = http://london
+        [ring:test2]
+        location = london
+        sproxyd_endpoints = http://london
 
-            [storage-policy:1]
-            read =
-            write = test1, test2
-            ''')
+        [storage-policy:1]
+        read =
+        write = test1, test2
+        '''),
+     re.compile('Multiple \'write\' rings defined in \'storage-policy:1\'')),
+]
 
-        utils.assertRaisesRegexp(
-            ConfigurationError,
-            'Multiple \'write\' rings defined in \'storage-policy:1\'',
-            Configuration.from_stream, conf)
 
-    def test_missing_read_in_storage_policy(self):
-        conf = self._format_config('''
-            [ring:test1]
-            location = paris
-            sproxyd_endpoints = http://localhost
+def _make_configuration_error_test(conf, regexp):
+    def test(self):
+        with self.assertRaisesRegexp(ConfigurationError, regexp):
+            Configuration.from_stream(_config_stream(conf))
 
-            [storage-policy:1]
-            write = test1
-            ''')
+    return test
 
-        conf = Configuration.from_stream(conf)
 
-        read_set = conf.get_policy(1).read_set
-        if len(read_set) != 0:
-            raise self.failureException(
-                '%r is not empty' % read_set)
+for (_name, _conf, _regexp) in _CONFIG_ERROR_CASES:
+    _test = _make_configuration_error_test(_conf, _regexp)
+    _test.__name__ = 'test_%s' % _name
+    setattr(TestConfiguration, _test.__name__, _test)
+
+del _name, _conf, _regexp, _test
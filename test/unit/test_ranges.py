@@ -15,16 +15,15 @@
 
 import base64
 import contextlib
+import cPickle as pickle
 import errno
 import gzip
 import httplib
 import json
 import os
 import os.path
-import pickle
 import shutil
 import tempfile
-import time
 import unittest
 
 import eventlet
@@ -44,6 +43,25 @@ try:
 except ImportError:
     HAS_STORAGE_POLICY = False
 
+# Object body served by the sproxyd mock
+_HUNDRED_UNDERSCORES = '_' * 100
+
+# Body of the sproxyd `.conf` resource, as probed by the failure detector
+_SPROXYD_CONF = json.dumps({
+    'by_path_enabled': True,
+}, indent=2)
+
+
+class _HeaderView(object):
+    """Read-only view on the HTTP request headers of a WSGI environment."""
+    __slots__ = ('_env',)
+
+    def __init__(self, env):
+        self._env = env
+
+    def __getitem__(self, name):
+        return self._env['HTTP_' + name.upper().replace('-', '_')]
+
 
 class TestRangeHeaders(unittest.TestCase):
     """
@@ -52,39 +70,52 @@ class TestRangeHeaders(unittest.TestCase):
     https://github.com/scality/ScalitySproxydSwift/issues/121 for more details.
     """
 
-    def setUp(self):
+    # Test being run, if any: that's where `sproxyd_mock` reads the body to
+    # serve from, and records the request headers it received
+    _current_test = None
+
+    # Encoded `X-Scal-Usermd` headers served by `sproxyd_mock`, by body length
+    _usermd_cache = {}
+
+    @classmethod
+    def setUpClass(cls):
         if HAS_STORAGE_POLICY:
             # Clear out any previously set storage policies
             swift.common.storage_policy.reload_storage_policies()
 
         # Test app servers and associated sockets
-        self.sockets = []
-        self.servers = []
+        cls.sockets = []
+        cls.servers = []
 
         # Bind proxy, account, container, and object server to a free port
         bind_address = ('127.0.0.1', 0)
 
-        # Directory holding account, container, and object rings
-        self.swift_dir = tempfile.mkdtemp()
+        # Directory holding account, container, and object rings, on tmpfs
+        # when available
+        cls.swift_dir = tempfile.mkdtemp(
+            prefix='swift-test-%d-' % os.getpid(),
+            dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
 
         # Setup mocked sproxyd server
         sproxyd_socket = eventlet.listen(bind_address)
-        self.sockets.append(sproxyd_socket)
+        cls.sockets.append(sproxyd_socket)
         sproxyd = eventlet.spawn(eventlet.wsgi.server, sproxyd_socket,
-                                 self.sproxyd_mock)
-        self.servers.append(sproxyd)
+                                 cls.sproxyd_mock)
+        cls.servers.append(sproxyd)
 
-        self.sproxyd_path = '/proxy/chord'
+        cls.sproxyd_path = '/proxy/chord'
         conf = {
-            'swift_dir': self.swift_dir,
-            'devices': self.swift_dir,
+            'swift_dir': cls.swift_dir,
+            'devices': cls.swift_dir,
             'mount_check': 'false',
             # Scality sproxyd config options
             'sproxyd_host': '%s:%d' % sproxyd_socket.getsockname(),
-            'sproxyd_path': self.sproxyd_path,
+            'sproxyd_path': cls.sproxyd_path,
         }
 
         # Hashes for the ring hashing algorithm when determining data placement
+        cls._orig_hash_path = (swift.common.utils.HASH_PATH_SUFFIX,
+                               swift.common.utils.HASH_PATH_PREFIX)
         swift.common.utils.HASH_PATH_SUFFIX = 'foo'
         swift.common.utils.HASH_PATH_PREFIX = 'bar'
 
@@ -95,49 +126,57 @@ class TestRangeHeaders(unittest.TestCase):
             ('object', swift_scality_backend.server.ObjectController(conf)),
         )
         for server_name, app in controllers:
-            self.setup_ring(server_name, app, bind_address)
+            cls.setup_ring(server_name, app, bind_address)
 
         # Setup swift proxy
         proxy_socket = eventlet.listen(bind_address)
-        self.sockets.append(proxy_socket)
-        proxy = swift.proxy.server.Application(conf)
+        cls.sockets.append(proxy_socket)
+        # Account management lets the test account be created through it
+        proxy = swift.proxy.server.Application(
+            dict(conf, allow_account_management='true'))
         proxy_server = eventlet.spawn(eventlet.wsgi.server, proxy_socket, proxy)
-        self.servers.append(proxy_server)
-
-        # Create test account
-        account = 'a'
-        partition, acc_nodes = proxy.account_ring.get_nodes(account)
-        acc_node = acc_nodes.pop()
-        acc_path = '/%s/%d/%s' % (acc_node['device'], partition, account)
-        acc_headers = {
-            'X-Timestamp': swift.common.utils.normalize_timestamp(time.time()),
-        }
-        acc_conn = httplib.HTTPConnection(acc_node['ip'], acc_node['port'])
-        acc_conn.request('PUT', acc_path, headers=acc_headers)
-        if acc_conn.getresponse().status != 201:
-            raise Exception("Unable to setup test account")
-
-        # Create test container
-        self.proxy_host, self.proxy_port = proxy_socket.getsockname()
-        proxy_conn = httplib.HTTPConnection(self.proxy_host, self.proxy_port)
-        proxy_conn.request('PUT', '/v1/a/c/')
-        if proxy_conn.getresponse().status != 201:
-            raise Exception("Unable to setup test container")
+        cls.servers.append(proxy_server)
+
+        # Create test account and container, over a connection which is kept
+        # alive, and shared by all tests
+        cls.proxy_host, cls.proxy_port = proxy_socket.getsockname()
+        cls._conn = httplib.HTTPConnection(cls.proxy_host, cls.proxy_port)
+
+        for (path, what) in [('/v1/a', 'account'), ('/v1/a/c/', 'container')]:
+            cls._conn.request('PUT', path)
+            resp = cls._conn.getresponse()
+            resp.read()
+            if resp.status != 201:
+                raise Exception("Unable to setup test %s" % what)
+
+    def setUp(self):
+        self.response = _HUNDRED_UNDERSCORES
+        self.sproxyd_request_headers = None
+
+        # The sproxyd mock is shared by all tests, let it know which one runs
+        type(self)._current_test = self
 
     def tearDown(self):
-        # Reset monkey patched hash paths
-        swift.common.utils.HASH_PATH_SUFFIX = ''
-        swift.common.utils.HASH_PATH_PREFIX = ''
+        type(self)._current_test = None
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            cls._conn.close()
 
-        # Stop wsgi servers
-        for wsgi_server in self.servers:
-            wsgi_server.kill()
+            # Stop wsgi servers
+            for wsgi_server in cls.servers:
+                wsgi_server.kill()
 
-        for socket in self.sockets:
-            socket.close()
+            for socket in cls.sockets:
+                socket.close()
+        finally:
+            # Reset monkey patched hash paths
+            (swift.common.utils.HASH_PATH_SUFFIX,
+             swift.common.utils.HASH_PATH_PREFIX) = cls._orig_hash_path
 
-        # Clean-up object rings
-        shutil.rmtree(self.swift_dir, ignore_errors=1)
+            # Clean-up object rings
+            shutil.rmtree(cls.swift_dir, ignore_errors=1)
 
     def _get(self, path, headers):
         """
@@ -146,17 +185,21 @@ class TestRangeHeaders(unittest.TestCase):
         :param path: Request path
         :type path: str
         :param headers: Request headers
-        :return: A tuple with response status, headers, and body.
+        :return: A tuple with response status, headers (a case-insensitive
+            `httplib.HTTPMessage`), and body.
         """
-        proxy_conn = httplib.HTTPConnection(self.proxy_host, self.proxy_port)
-        proxy_conn.request('GET', path, headers=headers)
-        r = proxy_conn.getresponse()
+        try:
+            self._conn.request('GET', path, headers=headers)
+            r = self._conn.getresponse()
+        except (httplib.BadStatusLine, httplib.CannotSendRequest):
+            # The proxy closed the connection: reconnect, and try once more
+            self._conn.close()
+            self._conn.request('GET', path, headers=headers)
+            r = self._conn.getresponse()
 
-        return r.status, dict(r.getheaders()), r.read()
+        return r.status, r.msg, r.read()
 
     def test_range_from_byte(self):
-        self.response = '_' * 100
-
         # Get last 95 bytes
         headers = {'Range': 'bytes=5-'}
         status, response_headers, _ = self._get('/v1/a/c/o', headers)
@@ -166,8 +209,6 @@ class TestRangeHeaders(unittest.TestCase):
         self.assertEqual(response_headers['content-length'], '95')
 
     def test_range_last_bytes(self):
-        self.response = '_' * 100
-
         # Get last 5 bytes
         headers = {'Range': 'bytes=-5'}
         status, response_headers, _ = self._get('/v1/a/c/o', headers)
@@ -177,8 +218,6 @@ class TestRangeHeaders(unittest.TestCase):
         self.assertEqual(response_headers['content-length'], '5')
 
     def test_range_explicit_first_bytes(self):
-        self.response = '_' * 100
-
         # Get first 5 bytes
         headers = {'Range': 'bytes=0-4'}
         status, response_headers, _ = self._get('/v1/a/c/o', headers)
@@ -188,8 +227,6 @@ class TestRangeHeaders(unittest.TestCase):
         self.assertEqual(response_headers['content-length'], '5')
 
     def test_range_explicit_intermediate(self):
-        self.response = '_' * 100
-
         headers = {'Range': 'bytes=20-40'}
         status, response_headers, _ = self._get('/v1/a/c/o', headers)
         self.assertEqual(status, 206)
@@ -198,8 +235,6 @@ class TestRangeHeaders(unittest.TestCase):
         self.assertEqual(response_headers['content-length'], '21')
 
     def test_range_explicit_end(self):
-        self.response = '_' * 100
-
         # Get last 5 bytes
         headers = {'Range': 'bytes=95-99'}
         status, response_headers, _ = self._get('/v1/a/c/o', headers)
@@ -209,8 +244,6 @@ class TestRangeHeaders(unittest.TestCase):
         self.assertEqual(response_headers['content-length'], '5')
 
     def test_range_exceed_length(self):
-        self.response = '_' * 100
-
         # Exceed object length by one
         headers = {'Range': 'bytes=95-100'}
         status, response_headers, _ = self._get('/v1/a/c/o', headers)
@@ -220,8 +253,6 @@ class TestRangeHeaders(unittest.TestCase):
         self.assertEqual(response_headers['content-length'], '5')
 
     def test_range_first_byte(self):
-        self.response = '_' * 100
-
         # Get first byte
         headers = {'Range': 'bytes=0-0'}
         status, response_headers, _ = self._get('/v1/a/c/o', headers)
@@ -230,13 +261,14 @@ class TestRangeHeaders(unittest.TestCase):
         self.assertEqual(response_headers['content-range'], 'bytes 0-0/100')
         self.assertEqual(response_headers['content-length'], '1')
 
-    def setup_ring(self, server_name, app, bind_address):
+    @classmethod
+    def setup_ring(cls, server_name, app, bind_address):
         """
         Setup a single replica ring.
         """
         # Device definition
         server_socket = eventlet.listen(bind_address)
-        self.sockets.append(server_socket)
+        cls.sockets.append(server_socket)
         server_ip, server_port = server_socket.getsockname()
         dev = {
             'id': 0,
@@ -248,7 +280,7 @@ class TestRangeHeaders(unittest.TestCase):
 
         # Prepare ring directory
         try:
-            os.makedirs(os.path.join(self.swift_dir, dev['device']))
+            os.makedirs(os.path.join(cls.swift_dir, dev['device']))
         except OSError as e:
             # Ignore if directory already exists
             if e.errno != errno.EEXIST:
@@ -258,43 +290,48 @@ class TestRangeHeaders(unittest.TestCase):
         replica2part2dev = [[0, 0, 0, 0]]
         part_shift = 30
         ring = swift.common.ring.RingData(replica2part2dev, [dev], part_shift)
-        path = '%s/%s.ring.gz' % (self.swift_dir, server_name)
-        with contextlib.closing(gzip.GzipFile(path, 'wb')) as f:
-            pickle.dump(ring, f)
+        path = '%s/%s.ring.gz' % (cls.swift_dir, server_name)
+        with contextlib.closing(gzip.GzipFile(path, 'wb', compresslevel=1)) as f:
+            pickle.dump(ring, f, pickle.HIGHEST_PROTOCOL)
 
         wsgi_server = eventlet.spawn(eventlet.wsgi.server, server_socket, app)
-        self.servers.append(wsgi_server)
+        cls.servers.append(wsgi_server)
 
-    def sproxyd_mock(self, env, start_response):
+    @classmethod
+    def sproxyd_mock(cls, env, start_response):
         method = env['REQUEST_METHOD']
         path = env['PATH_INFO']
+        test = cls._current_test
 
-        if method == 'GET' and path == '%s/.conf' % self.sproxyd_path:
+        if method == 'GET' and path == '%s/.conf' % cls.sproxyd_path:
             # Return configuration parameter expected by failure detector
-            response = json.dumps({
-                'by_path_enabled': True,
-            }, indent=2)
+            response = _SPROXYD_CONF
+        elif test is not None:
+            response = test.response
         else:
-            response = self.response
-
-        # Expected metadata (xattr) headers by swift
-        metadata = {
-            'X-Timestamp': swift.common.utils.normalize_timestamp(time.time()),
-            'Content-Length': len(response),
-            'ETag': 'some_hash',
-        }
-
-        headers = {
-            'Content-Type': 'application/json',
-            'X-Scal-Usermd': base64.b64encode(pickle.dumps(metadata)),
-            'Content-Length': len(response),
-        }
-
-        self.sproxyd_request_headers = dict(
-            (k[len('HTTP_'):], v)
-            for k, v in env.iteritems()
-            if k.startswith('HTTP_')
-        )
-
-        start_response('200 OK', headers.items())
+            # Requests made outside of a test, e.g. during `setUpClass`
+            response = _HUNDRED_UNDERSCORES
+
+        usermd = cls._usermd_cache.get(len(response))
+        if usermd is None:
+            # Expected metadata (xattr) headers by swift. None of the tests
+            # look at the timestamp, so a fixed one lets us encode this once.
+            metadata = {
+                'X-Timestamp': swift.common.utils.normalize_timestamp(0),
+                'Content-Length': len(response),
+                'ETag': 'some_hash',
+            }
+            usermd = base64.b64encode(pickle.dumps(metadata, pickle.HIGHEST_PROTOCOL))
+            cls._usermd_cache[len(response)] = usermd
+
+        headers = [
+            ('Content-Type', 'application/json'),
+            ('X-Scal-Usermd', usermd),
+            ('Content-Length', len(response)),
+        ]
+
+        if test is not None:
+            test.sproxyd_request_headers = _HeaderView(env)
+
+        start_response('200 OK', headers)
         return [response]
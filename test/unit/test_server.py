@@ -33,6 +33,24 @@ import swift_scality_backend.server
 from . import utils
 
 
+(setUpModule, tearDownModule) = utils.without_health_checks()
+
+
+_servers = {}
+
+
+def _app(factory, **conf):
+    '''Memoized `factory(conf)`, to share servers between tests'''
+
+    key = (factory, frozenset(conf.iteritems()))
+
+    server = _servers.get(key)
+    if server is None:
+        server = _servers[key] = factory(conf)
+
+    return server
+
+
 def test_api_compatible():
     '''
     Test whether `swift_scality_backend.server.app_factory`'s result is
@@ -44,9 +62,24 @@ def test_api_compatible():
         'replication_failure_ratio',
     ]
 
-    swift_server = swift.obj.server.app_factory({})
-    conf = {'sproxyd_host': 'host1:81'}
-    scality_server = swift_scality_backend.server.app_factory(conf)
+    swift_server = _app(swift.obj.server.app_factory)
+    scality_server = _app(
+        swift_scality_backend.server.app_factory, sproxyd_host='host1:81')
+
+    # Methods the Scality server inherits share their function with the
+    # Swift server, so only inspect each function once
+    argspecs = {}
+
+    def getargspec(func):
+        '''Memoized `inspect.getargspec`, keyed on the underlying function'''
+
+        func = getattr(func, '__func__', func)
+
+        spec = argspecs.get(func)
+        if spec is None:
+            spec = argspecs[func] = inspect.getargspec(func)
+
+        return spec
 
     def assert_compatible(name, spec1, spec2):
         '''Assert argspecs are compatible'''
@@ -79,39 +112,43 @@ def test_api_compatible():
         assert spec1_args == spec2_args[:nargs1], \
             'Incompatible arg names: %r' % name
 
-    def check_api_compatible(name):
-        '''Check whether the API of a given method name is compatible'''
+    missing = object()
 
-        assert hasattr(scality_server, name), 'Missing attribute: %r' % name
+    # Attributes to check, looked up once on both servers
+    cases = [
+        (name, getattr(swift_server, name),
+         getattr(scality_server, name, missing))
+        for name in dir(swift_server)
+        if name not in whitelist and name[0] != '_']
+
+    def check_api_compatible(name, swift_attr, scality_attr):
+        '''Check whether the API of a given method name is compatible'''
 
-        swift_attr = getattr(swift_server, name)
-        scality_attr = getattr(scality_server, name)
+        assert scality_attr is not missing, 'Missing attribute: %r' % name
 
         if callable(swift_attr):
             assert callable(scality_attr), 'Not callable: %r' % name
 
-            swift_spec = inspect.getargspec(swift_attr)
-            scality_spec = inspect.getargspec(scality_attr)
+            swift_spec = getargspec(swift_attr)
+            scality_spec = getargspec(scality_attr)
 
             assert_compatible(name, swift_spec, scality_spec)
 
-    for name in dir(swift_server):
-        if name in whitelist or name[0] == '_':
-            continue
+    for case in cases:
+        yield (check_api_compatible,) + case
 
-        yield check_api_compatible, name
+
+_SPROXYD_ENDPOINTS = ['http://h1:81/p', 'http://h2:81/p']
+_PARSED_SPROXYD_ENDPOINTS = frozenset(
+    urlparse.urlparse(e) for e in _SPROXYD_ENDPOINTS)
 
 
 def test_setup_with_sproxyd_endpoints():
-    endpoint1 = 'http://h1:81/p'
-    endpoint2 = 'http://h2:81/p'
-    conf = {'sproxyd_endpoints': ' , '.join([endpoint1, endpoint2])}
+    conf = {'sproxyd_endpoints': ' , '.join(_SPROXYD_ENDPOINTS)}
     obj_serv = swift_scality_backend.server.app_factory(conf)
 
-    assert frozenset([
-        urlparse.urlparse(endpoint1),
-        urlparse.urlparse(endpoint2),
-    ]) == obj_serv._get_client_for_policy(0).read_clients[0]._endpoints
+    assert _PARSED_SPROXYD_ENDPOINTS == \
+        obj_serv._get_client_for_policy(0).read_clients[0]._endpoints
 
 
 def test_setup_with_custom_timeout():
@@ -124,8 +161,8 @@ def test_setup_with_custom_timeout():
 
 
 def test_get_diskfile():
-    conf = {'sproxyd_host': 'host1:81'}
-    scality_server = swift_scality_backend.server.app_factory(conf)
+    scality_server = _app(
+        swift_scality_backend.server.app_factory, sproxyd_host='host1:81')
     diskfile = scality_server.get_diskfile('dev', 'partition', 'a', 'c', 'o')
 
     assert isinstance(diskfile, swift_scality_backend.diskfile.DiskFile)
@@ -151,6 +188,27 @@ _mock_policy_config_file.side_effect = _open
 del _open
 
 
+_BROKEN_POLICY = '''
+[storage-policy:1]
+write = no-such-ring
+'''
+
+_SIMPLE_POLICY = '''
+[ring:paris]
+location = paris
+sproxyd_endpoints = http://localhost:8080/chord, http://otherhost:8080/chord
+
+[storage-policy:1]
+read =
+write = paris
+'''
+
+_SIMPLE_POLICY_ENDPOINTS = frozenset([
+    urlparse.urlparse('http://localhost:8080/chord'),
+    urlparse.urlparse('http://otherhost:8080/chord'),
+])
+
+
 class FakeFile(StringIO.StringIO):
     def __enter__(self):
         return self
@@ -159,7 +217,6 @@ class FakeFile(StringIO.StringIO):
         pass
 
 
-@mock.patch('eventlet.spawn', mock.Mock())
 @mock.patch('__builtin__.open', _mock_policy_config_file)
 class TestStoragePolicySupport(unittest.TestCase):
     @staticmethod
@@ -207,13 +264,8 @@ class TestStoragePolicySupport(unittest.TestCase):
             self._app_factory().get_diskfile, 'dev', 'partition', 'a', 'c', 'o', policy_idx=1)
 
     def test_broken_policy_configuration(self):
-        policy = '\n'.join(line.strip() for line in '''
-            [storage-policy:1]
-            write = no-such-ring
-            '''.splitlines())
-
         mock_open = mock.mock_open()
-        mock_open.return_value = FakeFile(policy)
+        mock_open.return_value = FakeFile(_BROKEN_POLICY)
 
         with mock.patch('__builtin__.open', mock_open):
             utils.assertRaisesRegexp(
@@ -222,24 +274,13 @@ class TestStoragePolicySupport(unittest.TestCase):
                 self._app_factory)
 
     def test_simple_policy_configuration(self):
-        policy = '\n'.join(line.strip() for line in '''
-            [ring:paris]
-            location = paris
-            sproxyd_endpoints = http://localhost:8080/chord, http://otherhost:8080/chord
-
-            [storage-policy:1]
-            read =
-            write = paris
-            '''.splitlines())
-
         mock_open = mock.mock_open()
-        mock_open.return_value = FakeFile(policy)
+        mock_open.return_value = FakeFile(_SIMPLE_POLICY)
 
         with mock.patch('__builtin__.open', mock_open):
             df = self._app_factory().get_diskfile(
                 'dev', 'partition', 'a', 'c', 'o', policy_idx=1)
 
-            self.assertEqual(frozenset([
-                urlparse.urlparse('http://localhost:8080/chord'),
-                urlparse.urlparse('http://otherhost:8080/chord'),
-            ]), df._client_collection.read_clients[0]._alive)
+            self.assertEqual(
+                _SIMPLE_POLICY_ENDPOINTS,
+                df._client_collection.read_clients[0]._alive)
@@ -17,11 +17,8 @@
 
 import errno
 import fcntl
+import io
 import os
-try:
-    import cStringIO as StringIO
-except ImportError:
-    import StringIO
 
 import eventlet
 import mock
@@ -33,31 +30,55 @@ import swift_scality_backend.splice_utils
 import utils
 
 
-def _test_splice_socket_to_socket(test_length):
+# Cached result of `_read_pipe_max_size`
+PIPE_MAX_SIZE = None
+
+# Upper bound of the pipe size used by the splice tests
+TEST_PIPE_SIZE = 64 * 1024
+
+
+def _read_pipe_max_size():
     # Linux 2.6 (RHEL6) doesn't have this procfs entry
     # Whilst the code in `splice_utils` handles this gracefully, the tests used
     # to fail because of this.
     try:
         with open('/proc/sys/fs/pipe-max-size', 'r') as fd:
-            max_size = int(fd.read().strip())
+            return int(fd.read().strip())
     except IOError as exc:
-        if exc.errno == errno.ENOENT:
-            (rpipe, wpipe) = os.pipe()
-            try:
-                max_size = fcntl.fcntl(
-                    rpipe, swift_scality_backend.splice_utils.F_GETPIPE_SZ)
-            except IOError as exc:
-                if exc.errno == errno.EINVAL:
-                    max_size = \
-                        swift_scality_backend.splice_utils.MAX_PIPE_SIZE_2_6_34
-                else:
-                    raise
+        if exc.errno != errno.ENOENT:
+            raise
 
-            finally:
-                os.close(rpipe)
-                os.close(wpipe)
+    (rpipe, wpipe) = os.pipe()
+    try:
+        return fcntl.fcntl(
+            rpipe, swift_scality_backend.splice_utils.F_GETPIPE_SZ)
+    except IOError as exc:
+        if exc.errno == errno.EINVAL:
+            return swift_scality_backend.splice_utils.MAX_PIPE_SIZE_2_6_34
         else:
             raise
+    finally:
+        os.close(rpipe)
+        os.close(wpipe)
+
+
+def _get_pipe_max_size():
+    global PIPE_MAX_SIZE
+
+    if PIPE_MAX_SIZE is None:
+        PIPE_MAX_SIZE = _read_pipe_max_size()
+
+    return PIPE_MAX_SIZE
+
+
+def _get_test_pipe_size():
+    # A pipe of the default size is enough to exercise the splicing loops,
+    # and keeps the test payloads small
+    return min(_get_pipe_max_size(), TEST_PIPE_SIZE)
+
+
+def _test_splice_socket_to_socket(test_length):
+    max_size = _get_test_pipe_size()
 
     orig_message = 'Hello, world!' * max_size
 
@@ -74,7 +95,8 @@ def _test_splice_socket_to_socket(test_length):
     server2 = eventlet.listen(('127.0.0.1', 0))
     addr2 = server2.getsockname()
 
-    result = StringIO.StringIO()
+    # One spare byte, so overlong transfers don't go unnoticed
+    result = bytearray(test_message_length + 1)
 
     def run_server1(sock):
         (client, addr) = sock.accept()
@@ -91,25 +113,32 @@ def _test_splice_socket_to_socket(test_length):
     def run_server2(sock):
         (client, addr) = sock.accept()
 
+        view = memoryview(result)
+        received = 0
+
         while True:
-            data = client.recv(max_size)
+            count = client.recv_into(view[received:])
 
-            if len(data) == 0:
+            if count == 0:
                 break
 
-            result.write(data)
+            received += count
+
+        return received
 
     thread1 = eventlet.spawn(run_server1, server1)
     thread2 = eventlet.spawn(run_server2, server2)
 
     client = eventlet.connect(addr1)
-    client.sendall(orig_message)
+    # Don't copy what's left to send on every partial write
+    client.sendall(memoryview(orig_message))
     client.close()
 
     thread1.wait()
-    thread2.wait()
+    received = thread2.wait()
 
-    assert result.getvalue() == test_message
+    del result[received:]
+    assert result == test_message
 
 
 try:
@@ -124,18 +153,41 @@ except ImportError:
 
 @utils.skipIf(not HAS_SPLICE, "No `splice` support")
 def test_splice_socket_to_socket():
-    return _test_splice_socket_to_socket(test_length=False)
+    pipe_size = _get_test_pipe_size()
+
+    default_open = open
+
+    def fake_open(name, *args, **kwargs):
+        # `splice_utils` still reads the procfs entry, which reports the test
+        # pipe size so the payload spans many pipe buffers
+        if name == '/proc/sys/fs/pipe-max-size':
+            return io.BytesIO('%d\n' % pipe_size)
+        else:
+            return default_open(name, *args, **kwargs)
+
+    with mock.patch('__builtin__.open', side_effect=fake_open):
+        with mock.patch.object(swift_scality_backend.splice_utils,
+                               'MAX_PIPE_SIZE', None):
+            _test_splice_socket_to_socket(test_length=False)
+
+            mps = swift_scality_backend.splice_utils.MAX_PIPE_SIZE
+
+    assert mps == pipe_size, 'Unexpected MAX_PIPE_SIZE value: %d' % mps
 
 
 @utils.skipIf(not HAS_SPLICE, "No `splice` support")
 def test_splice_socket_to_socket_bounded():
-    return _test_splice_socket_to_socket(test_length=True)
+    with mock.patch.object(swift_scality_backend.splice_utils,
+                           'MAX_PIPE_SIZE', _get_test_pipe_size()):
+        return _test_splice_socket_to_socket(test_length=True)
 
 
 @utils.skipIf(not HAS_SPLICE, "No `splice` support")
 def test_splice_no_pipe_max_size():
     '''Test absence of `/proc/sys/fs/pipe-max-size`.'''
 
+    global PIPE_MAX_SIZE
+
     open_mock = mock.mock_open()
 
     default_open = open
@@ -150,7 +202,9 @@ def test_splice_no_pipe_max_size():
 
     with mock.patch('__builtin__.open', open_mock):
         with mock.patch('fcntl.fcntl', side_effect=fcntl.fcntl) as mock_fcntl:
+            # Probe again, without the procfs entry this time
             swift_scality_backend.splice_utils.MAX_PIPE_SIZE = None
+            PIPE_MAX_SIZE = None
 
             try:
                 _test_splice_socket_to_socket(test_length=True)
@@ -158,6 +212,7 @@ def test_splice_no_pipe_max_size():
                 mps = swift_scality_backend.splice_utils.MAX_PIPE_SIZE
             finally:
                 swift_scality_backend.splice_utils.MAX_PIPE_SIZE = None
+                PIPE_MAX_SIZE = None
 
             assert mps == 0, 'Unexpected MAX_PIPE_SIZE value: %d' % mps
 
@@ -16,18 +16,38 @@
 """A collection of functions that helps running unit tests"""
 
 import functools
+import logging
 import re
 import unittest
 
 import eventlet
 import mock
 import nose.plugins.skip
+import swift.common.utils
 
 from swift_scality_backend.http_utils import ClientCollection
 
 from scality_sproxyd_client.sproxyd_client import SproxydClient
 
 
+# Flavour of `splice` support provided by the installed Swift
+NEW_SPLICE = 'new_splice'
+OLD_SPLICE = 'old_splice'
+NO_SPLICE_AT_ALL = 'no_splice_at_all'
+try:
+    import swift.common.splice  # noqa
+    SPLICE = NEW_SPLICE
+except ImportError:
+    if hasattr(swift.common.utils, 'system_has_splice'):
+        SPLICE = OLD_SPLICE
+    else:
+        SPLICE = NO_SPLICE_AT_ALL
+
+
+# Logger for tests which don't check what gets logged
+DUMMY_LOGGER = mock.Mock(spec=logging.Logger)
+
+
 def skipIf(condition, reason):
     """
     A `skipIf` decorator.
@@ -48,16 +68,19 @@ def skipIf(condition, reason):
 def assertRaisesRegexp(expected_exception, expected_regexp,
                        callable_obj, *args, **kwargs):
     """Asserts that the message in a raised exception matches a regexp."""
+
+    # We accept both `string` and compiled regex object as 2nd argument to
+    # assertRaisesRegexp
+    if isinstance(expected_regexp, basestring):
+        expected_regexp = re.compile(expected_regexp)
+
     try:
         callable_obj(*args, **kwargs)
     except expected_exception as exc_value:
-        if not re.search(expected_regexp, str(exc_value)):
-            # We accept both `string` and compiled regex object as 2nd
-            # argument to assertRaisesRegexp
-            pattern = getattr(expected_regexp, 'pattern', expected_regexp)
+        if not expected_regexp.search(str(exc_value)):
             raise unittest.TestCase.failureException(
                 '"%s" does not match "%s"' %
-                (pattern, str(exc_value)))
+                (expected_regexp.pattern, str(exc_value)))
     else:
         if hasattr(expected_exception, '__name__'):
             excName = expected_exception.__name__
@@ -78,6 +101,25 @@ def assertRegexpMatches(text, expected_regexp, msg=None):
         raise unittest.TestCase.failureException(msg)
 
 
+def without_health_checks():
+    '''Module fixtures patching `eventlet.spawn` for the module's tests
+
+    This way, `SproxydClient` starts no health-check thread. The
+    `(setUpModule, tearDownModule)` pair returned is meant to be bound at the
+    top of a test module.
+    '''
+
+    patcher = mock.patch('eventlet.spawn', mock.Mock())
+
+    def setUpModule():
+        patcher.start()
+
+    def tearDownModule():
+        patcher.stop()
+
+    return (setUpModule, tearDownModule)
+
+
 def make_client_collection(endpoints=None, conn_timeout=None,
                            read_timeout=None, logger=None):
     '''Construct an `SproxydClient` instance using default values.'''
@@ -88,7 +130,7 @@ def make_client_collection(endpoints=None, conn_timeout=None,
     endpoints = maybe(['http://localhost:81/proxy/chord/'], endpoints)
     conn_timeout = maybe(10.0, conn_timeout)
     read_timeout = maybe(3.0, read_timeout)
-    logger = maybe(mock.Mock(), logger)
+    logger = maybe(DUMMY_LOGGER, logger)
 
     client = SproxydClient(
         endpoints=endpoints, conn_timeout=conn_timeout,